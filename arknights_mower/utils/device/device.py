@@ -140,5 +140,8 @@ class Device(object):
         """ check if the application is in the foreground """
         if self.current_focus() != config.APPNAME:
             self.launch(config.APPNAME)
-            # wait for app to finish launching
-            time.sleep(10)
+            # poll until the app comes to the foreground, 10s at most
+            for _ in range(20):
+                time.sleep(0.5)
+                if self.current_focus() == config.APPNAME:
+                    break
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import time
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import cv2
 import numpy as np
@@ -253,6 +253,25 @@ class Recognizer(object):
             raise RecognizeError(f"Can't find '{res}'") 
         return ret
 
+    def find_many(self, names: List[str], draw: bool = False, scope: tp.Scope = None, judge: bool = True) -> Dict[str, tp.Scope]:
+        """
+        在同一帧画面中批量查找多个元素
+
+        :param names: 待识别元素资源文件名列表
+        :param draw: 是否将识别结果输出到屏幕
+        :param scope: ((x0, y0), (x1, y1))，提前限定元素可能出现的范围
+        :param judge: 是否加入更加精确的判断
+
+        :return ret: 资源文件名到匹配位置的映射，未找到的元素对应 None
+        """
+        logger.debug(f'find_many: {names}')
+        matcher = self.matcher
+        ret = {}
+        for name in names:
+            res_img = loadimg(f'{__rootdir__}/resources/{name}.png', True)
+            ret[name] = matcher.match(res_img, draw=draw, scope=scope, judge=judge)
+        return ret
+
     def score(self, res: str, draw: bool = False, scope: tp.Scope = None, thres: int = None) -> Optional[List[float]]:
         """
         查找元素是否出现在画面中，并返回分数
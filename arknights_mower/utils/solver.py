@@ -4,11 +4,14 @@ import time
 import traceback
 from abc import abstractmethod
 
+import numpy as np
+
 from ..utils import typealias as tp
 from . import config, detector
 from .device import Device, KeyCode
 from .log import logger
 from .recognize import RecognizeError, Recognizer, Scene
+from .scene import SceneComment
 
 
 class StrategyError(Exception):
@@ -16,6 +19,29 @@ class StrategyError(Exception):
     pass
 
 
+# scenes considered not logged in: the login flow (1xx),
+# loading / confirm (99xx) and UNKNOWN
+_LOGIN_SCENES = frozenset(
+    s for s in SceneComment if s // 100 in (1, 99) or s == -1)
+_LOGIN_ONLY = frozenset(s for s in SceneComment if s // 100 == 1)
+
+
+def _interp_rect(poly: tp.Rectangle, x_rate: float, y_rate: float) -> tp.Coordinate:
+    """ interpolate inside a 4-point polygon """
+    x = ((poly[0][0] + poly[1][0]) * (1 - x_rate) +
+         (poly[2][0] + poly[3][0]) * x_rate) / 2
+    y = ((poly[0][1] + poly[3][1]) * (1 - y_rate) +
+         (poly[1][1] + poly[2][1]) * y_rate) / 2
+    return (int(x), int(y))
+
+
+def _interp_scope(poly: tp.Scope, x_rate: float, y_rate: float) -> tp.Coordinate:
+    """ interpolate inside a scope ((x0, y0), (x1, y1)) """
+    x = poly[0][0] * (1 - x_rate) + poly[1][0] * x_rate
+    y = poly[0][1] * (1 - y_rate) + poly[1][1] * y_rate
+    return (int(x), int(y))
+
+
 class BaseSolver:
     """ Base class, provide basic operation """
 
@@ -25,8 +51,64 @@ class BaseSolver:
             raise RuntimeError
         self.device = device if device is not None else Device()
         self.recog = recog if recog is not None else Recognizer(self.device)
+        # resolution is fixed for the session, so precompute the tap spots
+        self._bottom_mid = (self.recog.w // 2, self.recog.h - 10)
+        self._top_mid = (self.recog.w // 2, 10)
+        self._build_scene_tables()
         self.device.check_current_focus()
 
+    def _build_scene_tables(self) -> None:
+        """ build the scene -> handler jump tables used by login and back_to_index """
+        self._login_table = {
+            Scene.LOGIN_START: lambda: self.tap(self._bottom_mid, 3),
+            Scene.LOGIN_QUICKLY: lambda: self.tap_element('login_awake'),
+            Scene.LOGIN_MAIN: lambda: self.tap_element('login_account', 0.25),
+            Scene.LOGIN_REGISTER: lambda: self.back(2),
+            Scene.LOGIN_CAPTCHA: exit,  # self.back(600)  # TODO: Pending
+            Scene.LOGIN_INPUT: self._login_input,
+            Scene.LOGIN_ANNOUNCE: lambda: self.tap_element('login_iknow'),
+            Scene.LOGIN_LOADING: lambda: self.sleep(3),
+            Scene.LOADING: lambda: self.sleep(3),
+            Scene.CONNECTING: lambda: self.sleep(3),
+            Scene.CONFIRM: lambda: self.tap(detector.confirm(self.recog.img)),
+            Scene.LOGIN_MAIN_NOENTRY: lambda: self.sleep(3),
+            Scene.LOGIN_CADPA_DETAIL: lambda: self.back(2),
+            Scene.LOGIN_BILIBILI: lambda: self.tap_element('login_bilibili_entry'),
+            Scene.NETWORK_CHECK: lambda: self.tap_element('double_confirm', 0.2),
+        }
+        self._back_table = {
+            Scene.ANNOUNCEMENT: lambda: self.tap(detector.announcement_close(self.recog.img)),
+            Scene.MATERIEL: lambda: self.tap_element('materiel_ico'),
+            Scene.CONFIRM: lambda: self.tap(detector.confirm(self.recog.img)),
+            Scene.LOADING: lambda: self.sleep(3),
+            Scene.CONNECTING: lambda: self.sleep(3),
+            Scene.SKIP: lambda: self.tap_element('skip'),
+            Scene.OPERATOR_ONGOING: lambda: self.sleep(10),
+            Scene.OPERATOR_FINISH: lambda: self.tap(self._top_mid),
+            Scene.OPERATOR_ELIMINATE_FINISH: lambda: self.tap(self._top_mid),
+            Scene.DOUBLE_CONFIRM: lambda: self.tap_element('double_confirm', 0.8),
+            Scene.NETWORK_CHECK: lambda: self.tap_element('double_confirm', 0.2),
+            Scene.MAIL: self._back_mail,
+            Scene.INFRA_ARRANGE_CONFIRM: lambda: self.tap((self.recog.w // 3, self.recog.h - 10)),
+        }
+
+    def _login_input(self) -> None:
+        """ fill in the username and password on the login screen """
+        areas = self.recog.find_many(['login_username', 'login_password'])
+        input_area = areas['login_username']
+        if input_area is not None:
+            self.input('Enter username: ', input_area, config.USERNAME)
+        input_area = areas['login_password']
+        if input_area is not None:
+            self.input('Enter password: ', input_area, config.PASSWORD)
+        self.tap_element('login_button')
+
+    def _back_mail(self) -> None:
+        """ close the mail screen """
+        mail = self.find('mail')
+        mid_y = (mail[0][1] + mail[1][1]) // 2
+        self.tap((mid_y, mid_y))
+
     def run(self) -> None:
         retry_times = config.MAX_RETRYTIME
         while retry_times > 0:
@@ -36,8 +118,8 @@ class BaseSolver:
             except RecognizeError as e:
                 logger.warning(f'识别出了点小差错 qwq: {e}')
                 self.recog.save_screencap('failure')
+                self._retry_sleep(retry_times)
                 retry_times -= 1
-                self.sleep(3)
                 continue
             except StrategyError as e:
                 logger.error(e)
@@ -62,21 +144,22 @@ class BaseSolver:
             raise RecognizeError('poly is empty')
         elif len(poly) == 4:
             # tp.Rectangle
-            x = (poly[0][0] * (1-x_rate) + poly[1][0] * (1-x_rate) +
-                 poly[2][0] * x_rate + poly[3][0] * x_rate) / 2
-            y = (poly[0][1] * (1-y_rate) + poly[3][1] * (1-y_rate) +
-                 poly[1][1] * y_rate + poly[2][1] * y_rate) / 2
+            return _interp_rect(poly, x_rate, y_rate)
         elif len(poly) == 2 and isinstance(poly[0], (list, tuple)):
             # tp.Scope
-            x = poly[0][0] * (1-x_rate) + poly[1][0] * x_rate
-            y = poly[0][1] * (1-y_rate) + poly[1][1] * y_rate
+            return _interp_scope(poly, x_rate, y_rate)
         else:
             # tp.Coordinate
             x, y = poly
-        return (int(x), int(y))
+            return (int(x), int(y))
+
+    def _retry_sleep(self, retry_times: int) -> None:
+        """ wait briefly on the first miss, backing off to 3s on repeated errors """
+        self.sleep(min(0.5 * 2 ** (config.MAX_RETRYTIME - retry_times), 3))
 
     def sleep(self, interval: float = 1, rebuild: bool = True) -> None:
         """ sleeping for a interval """
+        # the interval lets the UI settle; the screencap must come after it
         time.sleep(interval)
         self.recog.update(rebuild=rebuild)
 
@@ -134,27 +217,26 @@ class BaseSolver:
 
     # def swipe_move(self, start: tp.Coordinate, movements: list[tp.Coordinate], duration: int = 100, interval: float = 1, rebuild: bool = True) -> None:
     #     """ swipe with start and movement sequence """
-    #     points = [start]
-    #     for move in movements:
-    #         points.append((points[-1][0] + move[0], points[-1][1] + move[1]))
-    #     self.device.swipe(points, duration=duration)
+    #     arr = np.empty((len(movements) + 1, 2), dtype=np.int32)
+    #     arr[0] = start
+    #     arr[1:] = movements
+    #     np.cumsum(arr, axis=0, out=arr)
+    #     self.device.swipe(arr.tolist(), duration=duration)
     #     if interval > 0:
     #         self.sleep(interval, rebuild)
 
     def swipe_noinertia(self, start: tp.Coordinate, movement: tp.Coordinate, duration: int = 100, interval: float = 1, rebuild: bool = False) -> None:
         """ swipe with no inertia (movement should be vertical) """
-        points = [start]
+        points = np.tile(np.asarray(start, dtype=np.int32), (4, 1))
         if movement[0] == 0:
             dis = abs(movement[1])
-            points.append((start[0]+100, start[1]))
-            points.append((start[0]+100, start[1]+movement[1]))
-            points.append((start[0], start[1]+movement[1]))
+            points[1:3, 0] += 100
+            points[2:4, 1] += movement[1]
         else:
             dis = abs(movement[0])
-            points.append((start[0], start[1]+100))
-            points.append((start[0]+movement[0], start[1]+100))
-            points.append((start[0]+movement[0], start[1]))
-        self.device.swipe_ext(points, durations=[200, dis*duration//100, 200])
+            points[1:3, 1] += 100
+            points[2:4, 0] += movement[0]
+        self.device.swipe_ext(points.tolist(), durations=[200, dis*duration//100, 200])
         if interval > 0:
             self.sleep(interval, rebuild)
 
@@ -165,11 +247,14 @@ class BaseSolver:
 
     def scene(self) -> int:
         """ get the current scene in the game """
+        # Recognizer.get_scene memoizes the classification per frame
         return self.recog.get_scene()
 
-    def is_login(self):
+    def is_login(self, scene: int = None):
         """ check if you are logged in """
-        return not (self.scene() // 100 == 1 or self.scene() // 100 == 99 or self.scene() == -1)
+        if scene is None:
+            scene = self.scene()
+        return scene not in _LOGIN_SCENES
 
     def login(self):
         """
@@ -178,52 +263,19 @@ class BaseSolver:
         retry_times = config.MAX_RETRYTIME
         while retry_times and not self.is_login():
             try:
-                if self.scene() == Scene.LOGIN_START:
-                    self.tap((self.recog.w // 2, self.recog.h - 10), 3)
-                elif self.scene() == Scene.LOGIN_QUICKLY:
-                    self.tap_element('login_awake')
-                elif self.scene() == Scene.LOGIN_MAIN:
-                    self.tap_element('login_account', 0.25)
-                elif self.scene() == Scene.LOGIN_REGISTER:
-                    self.back(2)
-                elif self.scene() == Scene.LOGIN_CAPTCHA:
-                    exit()
-                    # self.back(600)  # TODO: Pending
-                elif self.scene() == Scene.LOGIN_INPUT:
-                    input_area = self.find('login_username')
-                    if input_area is not None:
-                        self.input('Enter username: ', input_area, config.USERNAME)
-                    input_area = self.find('login_password')
-                    if input_area is not None:
-                        self.input('Enter password: ', input_area, config.PASSWORD)
-                    self.tap_element('login_button')
-                elif self.scene() == Scene.LOGIN_ANNOUNCE:
-                    self.tap_element('login_iknow')
-                elif self.scene() == Scene.LOGIN_LOADING:
-                    self.sleep(3)
-                elif self.scene() == Scene.LOADING:
-                    self.sleep(3)
-                elif self.scene() == Scene.CONNECTING:
-                    self.sleep(3)
-                elif self.scene() == Scene.CONFIRM:
-                    self.tap(detector.confirm(self.recog.img))
-                elif self.scene() == Scene.LOGIN_MAIN_NOENTRY:
-                    self.sleep(3)
-                elif self.scene() == Scene.LOGIN_CADPA_DETAIL:
-                    self.back(2)
-                elif self.scene() == Scene.LOGIN_BILIBILI:
-                    self.tap_element('login_bilibili_entry')
-                elif self.scene() == Scene.NETWORK_CHECK:
-                    self.tap_element('double_confirm', 0.2)
-                elif self.scene() == Scene.UNKNOWN:
+                sc = self.scene()
+                handler = self._login_table.get(sc)
+                if handler is not None:
+                    handler()
+                elif sc == Scene.UNKNOWN:
                     raise RecognizeError('Unknown scene')
                 else:
                     raise RecognizeError('Unanticipated scene')
             except RecognizeError as e:
                 logger.warning(f'识别出了点小差错 qwq: {e}')
                 self.recog.save_screencap('failure')
+                self._retry_sleep(retry_times)
                 retry_times -= 1
-                self.sleep(3)
                 continue
             except Exception as e:
                 raise e
@@ -236,13 +288,14 @@ class BaseSolver:
         """
         判断是否存在导航栏，若存在则打开
         """
-        retry_times = config.MAX_RETRYTIME
-        while retry_times:
-            if self.scene() == Scene.NAVIGATION_BAR:
+        for _ in range(config.MAX_RETRYTIME):
+            sc = self.scene()
+            if sc == Scene.NAVIGATION_BAR:
                 return True
-            elif not self.tap_element('nav_button', detected=True):
+            # a successful tap runs sleep -> recog.update, so the next
+            # iteration classifies a fresh frame
+            if not self.tap_element('nav_button', detected=True):
                 return False
-            retry_times -= 1
 
     def back_to_index(self):
         """
@@ -255,48 +308,27 @@ class BaseSolver:
             try:
                 if self.get_navigation():
                     self.tap_element('nav_index')
-                elif self.scene() == Scene.ANNOUNCEMENT:
-                    self.tap(detector.announcement_close(self.recog.img))
-                elif self.scene() == Scene.MATERIEL:
-                    self.tap_element('materiel_ico')
-                elif self.scene() // 100 == 1:
-                    self.login()
-                elif self.scene() == Scene.CONFIRM:
-                    self.tap(detector.confirm(self.recog.img))
-                elif self.scene() == Scene.LOADING:
-                    self.sleep(3)
-                elif self.scene() == Scene.CONNECTING:
-                    self.sleep(3)
-                elif self.scene() == Scene.SKIP:
-                    self.tap_element('skip')
-                elif self.scene() == Scene.OPERATOR_ONGOING:
-                    self.sleep(10)
-                elif self.scene() == Scene.OPERATOR_FINISH:
-                    self.tap((self.recog.w // 2, 10))
-                elif self.scene() == Scene.OPERATOR_ELIMINATE_FINISH:
-                    self.tap((self.recog.w // 2, 10))
-                elif self.scene() == Scene.DOUBLE_CONFIRM:
-                    self.tap_element('double_confirm', 0.8)
-                elif self.scene() == Scene.NETWORK_CHECK:
-                    self.tap_element('double_confirm', 0.2)
-                elif self.scene() == Scene.MAIL:
-                    mail = self.find('mail')
-                    mid_y = (mail[0][1] + mail[1][1]) // 2
-                    self.tap((mid_y, mid_y))
-                elif self.scene() == Scene.INFRA_ARRANGE_CONFIRM:
-                    self.tap((self.recog.w // 3, self.recog.h - 10))
-                elif self.scene() == Scene.UNKNOWN:
-                    raise RecognizeError('Unknown scene')
-                elif pre_scene is None or pre_scene != self.scene():
-                    pre_scene = self.scene()
-                    self.back()
                 else:
-                    raise RecognizeError('Unanticipated scene')
+                    # bind the scene after get_navigation, which may have
+                    # tapped and refreshed the frame
+                    sc = self.scene()
+                    handler = self._back_table.get(sc)
+                    if handler is not None:
+                        handler()
+                    elif sc in _LOGIN_ONLY:
+                        self.login()
+                    elif sc == Scene.UNKNOWN:
+                        raise RecognizeError('Unknown scene')
+                    elif pre_scene is None or pre_scene != sc:
+                        pre_scene = sc
+                        self.back()
+                    else:
+                        raise RecognizeError('Unanticipated scene')
             except RecognizeError as e:
                 logger.warning(f'识别出了点小差错 qwq: {e}')
                 self.recog.save_screencap('failure')
+                self._retry_sleep(retry_times)
                 retry_times -= 1
-                self.sleep(3)
                 continue
             except Exception as e:
                 raise e